@@ -96,6 +96,12 @@ def main():
         # Short delay to prevent hitting rate limits
         time.sleep(1)
 
+    if pending_tracks:
+        stats = finder.get_stats()
+        print(f"Search stats: {stats['calls_per_track']:.2f} calls/track, "
+              f"{stats['bytes_per_track'] / 1024:.1f} KB/track, "
+              f"{stats['fallbacks']} fallback searches, {stats['rejected']} rejected matches.")
+
     # --- Part 3: Download & Tagging ---
     print("\n--- Starting Downloads ---")
 
@@ -4,79 +4,325 @@ Music API Wrapper.
 Interface for the ytmusicapi library to search and retrieve metadata.
 Focuses on finding the best match (Official Song or High Quality Video) based on
 title and artist queries.
+
+Searches are tiered to keep requests small:
+1. A filtered 'songs' search with a small limit.
+2. An unfiltered search (songs + videos) only if no song matches well enough.
+Candidates are scored locally against the OCR text (string similarity + duration plausibility)
+so a wrong result isn't picked just because it came first.
 """
 
+from functools import partial
 from ytmusicapi import YTMusic
+import numpy as np
+import re
+import requests
+
+# Number of tier 1 (songs only) results that are scored.
+# ytmusicapi still downloads the full first page of results, this only keeps the top ones.
+SONGS_LIMIT = 5
+
+# A song candidate with at least this score is accepted without the unfiltered fallback
+ACCEPT_SCORE = 0.6
+
+# Candidates scoring below this are rejected (better NOT FOUND than a wrong download)
+MIN_SCORE = 0.25
+
+# Plausible track length in seconds, anything outside is most likely a mix, a live stream or a teaser
+MIN_DURATION = 60
+MAX_DURATION = 15 * 60
+
+# Allowed difference (in seconds) between the duration read from the screenshot and the candidate
+DURATION_TOLERANCE = 10
+
+# Similarity given to a candidate whose title and artist can't be compared with the query
+# (missing, or written in a different script) but whose duration matches the one read from the screenshot.
+# Without a matching duration such a candidate gets no similarity at all.
+NEUTRAL_SCORE = 0.4
+
+# Weight of the title in the similarity score, the rest goes to the artist.
+# Only fields that can be compared with the query count, the weights are renormalized over them.
+TITLE_WEIGHT = 0.6
+
+# Durations like "3:45" that often appear next to the track name in screenshots
+DURATION_PATTERN = re.compile(r'\b(\d{1,2}):([0-5]\d)\b')
+
+LATIN_PATTERN = re.compile(r'[a-zA-Z]')
+
 
 class MusicFinder:
     def __init__(self):
+        # Use our own session so we can measure the size of every API response
+        session = requests.Session()
+        session.request = partial(session.request, timeout=30) # Same timeout as the ytmusicapi default session
+        session.hooks['response'].append(self._count_response)
+
         # Create an instance of the YTMusic class
         # No login is required for general search
-        self.yt = YTMusic()
+        self.yt = YTMusic(requests_session=session)
 
-    def find_best_match(self, query):
+        # Search statistics, see get_stats()
+        self.stats = {
+            'tracks': 0, 'calls': 0, 'payload_bytes': 0, 'fallbacks': 0, 'rejected': 0,
+            'tier1_accepts': 0, 'tier1_bytes': 0, 'fallback_bytes': 0,
+        }
+
+    def _count_response(self, response, *args, **kwargs):
         """
-        Search YouTube Music and find the best match.
-        It checks both official songs and videos
-        to also find remixes and unofficial covers.
+        requests hook: adds the size of each API response to the statistics.
+        """
+        self.stats['payload_bytes'] += len(response.content)
+
+    def get_stats(self):
+        """
+        Returns the search statistics, including the average number of API calls and bytes per track,
+        how often tier 1 was accepted and the average payload of a tier 1 and an unfiltered call.
         """
+        stats = dict(self.stats)
+        tracks = stats['tracks'] or 1
+        stats['calls_per_track'] = stats['calls'] / tracks
+        stats['bytes_per_track'] = stats['payload_bytes'] / tracks
+        stats['tier1_accept_rate'] = stats['tier1_accepts'] / tracks
+        stats['tier1_bytes_per_call'] = stats['tier1_bytes'] / tracks
+        stats['fallback_bytes_per_call'] = stats['fallback_bytes'] / (stats['fallbacks'] or 1)
+        return stats
+
+    def search(self, query, filter=None, limit=20):
+        """
+        Runs a single search request and counts it in the statistics.
+        Returns an empty list on error.
+        """
+        self.stats['calls'] += 1
         try:
-            # General search (no filters to get everything)
-            results = self.yt.search(query)
+            return self.yt.search(query, filter=filter, limit=limit)
         except Exception as e:
             print(f"Error searching for '{query}': {e}")
+            return []
+
+    def parse_result(self, item):
+        """
+        Converts a song or video search result into the track info dict used by the database.
+        """
+        # Extract artist information
+        artists = []
+        if 'artists' in item:
+            artists = [a['name'] for a in item['artists']]
+        artist_text = ", ".join(artists)
+
+        # Extract album name (videos usually don't have an album)
+        album = "Single"
+        if 'album' in item and item['album']:
+            album = item['album']['name']
+
+        # Extract the best quality cover image
+        cover = ""
+        if 'thumbnails' in item:
+            # The last item is usually the highest quality
+            cover = item['thumbnails'][-1]['url']
+
+        return {
+            'yt_id': item['videoId'],
+            'title': item['title'],
+            'artist': artist_text,
+            'album': album,
+            'cover_url': cover,
+            'duration': item.get('duration', ''),
+            'type': item['resultType'] # To know if it's official or a video
+        }
+
+    def parse_duration(self, text):
+        """
+        Returns the first duration found in the text (e.g. "3:45") in seconds, or None.
+        """
+        match = DURATION_PATTERN.search(text)
+        if not match:
             return None
+        return int(match.group(1)) * 60 + int(match.group(2))
+
+    def similarity(self, query, candidates):
+        """
+        Vectorized string similarity between the query and every candidate text.
+        Each text becomes a set of character trigrams, and the share of each candidate's trigrams
+        found in the query is computed for all candidates at once with numpy.
+        A short title inside a longer OCR line (which also holds the artist) still scores high.
+        Returns an array of scores between 0 and 1.
+        """
+        def trigrams(text):
+            text = f" {' '.join(text.lower().split())} "
+            return {text[i:i + 3] for i in range(len(text) - 2)}
+
+        texts = [query] + candidates
+        grams = [trigrams(t) for t in texts]
+
+        vocabulary = {}
+        for gram_set in grams:
+            for gram in gram_set:
+                vocabulary.setdefault(gram, len(vocabulary))
+
+        matrix = np.zeros((len(texts), len(vocabulary)))
+        for row, gram_set in enumerate(grams):
+            for gram in gram_set:
+                matrix[row, vocabulary[gram]] = 1
 
-        if not results:
+        sizes = matrix[1:].sum(axis=1)
+        sizes[sizes == 0] = 1
+
+        return (matrix[1:] @ matrix[0]) / sizes
+
+    def score_candidates(self, query, items):
+        """
+        Scores search results locally against the OCR text.
+        - String similarity of the title and of the artist against the query. A field that is missing
+          or written in a different script than the query is left out, and the weights are renormalized.
+        - If neither field can be compared, the candidate only gets NEUTRAL_SCORE when its duration
+          matches the one read from the screenshot.
+        - Penalty for implausible durations, bonus if it matches a duration read from the screenshot.
+        - Small bonus for official songs over videos.
+        Returns a list of (score, comparable, item) sorted from best to worst.
+        comparable is False when neither field could be compared with the query.
+        """
+        items = [item for item in items if item.get('resultType') in ['song', 'video'] and item.get('videoId')]
+        if not items:
+            return []
+
+        titles = [item['title'] for item in items]
+        artists = [" ".join(a['name'] for a in item.get('artists') or []) for item in items]
+        clean_query = DURATION_PATTERN.sub('', query).strip()
+        query_latin = bool(LATIN_PATTERN.search(clean_query))
+
+        def comparable_mask(texts):
+            # A Persian title can't be compared with a transliterated query (and vice versa)
+            return np.array([bool(text.strip()) and bool(LATIN_PATTERN.search(text)) == query_latin for text in texts])
+
+        # Each field is scored on its own, so a Persian title with a Latin artist name
+        # doesn't dilute the artist match (and vice versa)
+        title_weights = TITLE_WEIGHT * comparable_mask(titles)
+        artist_weights = (1 - TITLE_WEIGHT) * comparable_mask(artists)
+        total_weights = title_weights + artist_weights
+        comparable = total_weights > 0
+
+        scores = (
+            title_weights * self.similarity(clean_query, titles)
+            + artist_weights * self.similarity(clean_query, artists)
+        ) / np.where(comparable, total_weights, 1)
+
+        expected_duration = self.parse_duration(query)
+        durations = np.array([item.get('duration_seconds') or 0 for item in items], dtype=float)
+
+        # Duration plausibility (unknown duration = no penalty)
+        known = durations > 0
+        implausible = known & ((durations < MIN_DURATION) | (durations > MAX_DURATION))
+        scores = scores - 0.3 * implausible
+
+        if expected_duration is not None:
+            close = known & (np.abs(durations - expected_duration) <= DURATION_TOLERANCE)
+            scores = scores + 0.1 * close - 0.2 * (known & ~close)
+            # Nothing to compare but the duration: only a matching duration makes it a candidate
+            scores = scores + NEUTRAL_SCORE * (close & ~comparable)
+
+        scores = scores + 0.05 * np.array([item['resultType'] == 'song' for item in items])
+
+        ranked = sorted(zip(scores.tolist(), comparable.tolist(), items), key=lambda entry: entry[0], reverse=True)
+        return ranked
+
+    def find_best_match(self, query):
+        """
+        Search YouTube Music and find the best match.
+        It checks official songs first (filtered request, top SONGS_LIMIT results scored), and only falls back
+        to a full search including videos to also find remixes and unofficial covers.
+        """
+        self.stats['tracks'] += 1
+        search_query = DURATION_PATTERN.sub('', query).strip() or query
+
+        # Tier 1: songs only
+        start_bytes = self.stats['payload_bytes']
+        songs = self.search(search_query, filter='songs', limit=SONGS_LIMIT)[:SONGS_LIMIT]
+        self.stats['tier1_bytes'] += self.stats['payload_bytes'] - start_bytes
+        ranked = self.score_candidates(query, songs)
+
+        # Tier 2: unfiltered search, only if no song is a convincing match.
+        # A song whose title and artist couldn't be compared with the query is never convincing.
+        if ranked and ranked[0][0] >= ACCEPT_SCORE and ranked[0][1]:
+            self.stats['tier1_accepts'] += 1
+        else:
+            self.stats['fallbacks'] += 1
+            start_bytes = self.stats['payload_bytes']
+            results = self.search(search_query)
+            self.stats['fallback_bytes'] += self.stats['payload_bytes'] - start_bytes
+            ranked = sorted(
+                ranked + self.score_candidates(query, results),
+                key=lambda entry: entry[0], reverse=True
+            )
+
+        if not ranked:
             return None
 
-        # Return the first result that is a song or video
-        for item in results:
-            if item['resultType'] in ['song', 'video']:
-                
-                # Extract artist information
-                artists = []
-                if 'artists' in item:
-                    artists = [a['name'] for a in item['artists']]
-                artist_text = ", ".join(artists)
-
-                # Extract album name (videos usually don't have an album)
-                album = "Single"
-                if 'album' in item and item['album']:
-                    album = item['album']['name']
-
-                # Extract the best quality cover image
-                cover = ""
-                if 'thumbnails' in item:
-                    # The last item is usually the highest quality
-                    cover = item['thumbnails'][-1]['url']
-
-                return {
-                    'yt_id': item['videoId'],
-                    'title': item['title'],
-                    'artist': artist_text,
-                    'album': album,
-                    'cover_url': cover,
-                    'duration': item.get('duration', ''),
-                    'type': item['resultType'] # To know if it's official or a video
-                }
-        
-        return None
+        best_score, _, best_item = ranked[0]
+        if best_score < MIN_SCORE:
+            # Nothing looks like the OCR text, skip it instead of downloading the wrong track
+            self.stats['rejected'] += 1
+            return None
+
+        return self.parse_result(best_item)
 
 # Test section
 if __name__ == "__main__":
+    # Usage: python music_api.py [queries.tsv]
+    # Compares the tiered search with the previous strategy (unfiltered search, first song/video),
+    # including the measured payload of a songs-only call against an unfiltered one.
+    # Each line of the optional TSV file is "query<TAB>expected video id" and is used to measure the
+    # found rate and the wrong-download rate (both over labeled queries). Without it, the sample query below is searched.
+    import sys
+
     finder = MusicFinder()
-    
-    # Test with a query that likely has a remix
-    print("Testing search...")
-    test_query = "man delam nemikhast shayea" # Test example
-    result = finder.find_best_match(test_query)
-    
-    if result:
-        print("Found:")
-        print(f"Title: {result['title']}")
-        print(f"Artist: {result['artist']}")
-        print(f"Type: {result['type'].upper()}") # Song or Video
-        print(f"ID: {result['yt_id']}")
-    else:
-        print("Nothing found.")
\ No newline at end of file
+
+    cases = [("man delam nemikhast shayea", None)] # Test example
+    if len(sys.argv) > 1:
+        cases = []
+        with open(sys.argv[1], encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if parts[0].strip():
+                    cases.append((parts[0], parts[1] if len(parts) > 1 and parts[1] else None))
+
+    def previous_strategy(query):
+        # The old behaviour: one unfiltered search, first song or video wins
+        finder.stats['tracks'] += 1
+        for item in finder.search(query):
+            if item['resultType'] in ['song', 'video']:
+                return finder.parse_result(item)
+        return None
+
+    report = {}
+    for name, strategy in [("previous", previous_strategy), ("tiered", finder.find_best_match)]:
+        finder.stats = {key: 0 for key in finder.stats}
+        wrong = found = labeled = 0
+
+        for query, expected_id in cases:
+            result = strategy(query)
+            print(f"[{name}] {query} -> {result['title'] + ' by ' + result['artist'] if result else 'NOT FOUND'}")
+            if expected_id:
+                labeled += 1
+                # A wrong pick is a download of the wrong track.
+                # NOT FOUND costs no download but loses the track, so it is reported separately.
+                if result:
+                    found += 1
+                    if result['yt_id'] != expected_id:
+                        wrong += 1
+
+        report[name] = finder.get_stats()
+        report[name]['wrong_rate'] = wrong / labeled if labeled else None
+        report[name]['found_rate'] = found / labeled if labeled else None
+
+    print()
+    for name, stats in report.items():
+        print(f"{name:>8}: {stats['calls_per_track']:.2f} calls/track, "
+              f"{stats['bytes_per_track'] / 1024:.1f} KB/track, "
+              f"found: {format(stats['found_rate'], '.0%') if stats['found_rate'] is not None else 'n/a'}, "
+              f"wrong downloads: {format(stats['wrong_rate'], '.0%') if stats['wrong_rate'] is not None else 'n/a (no labels)'}")
+
+    # Measured payload of one songs-only request vs one unfiltered request (the previous strategy makes one per track)
+    tiered = report['tiered']
+    print(f"tier 1 accepted: {tiered['tier1_accept_rate']:.0%} of tracks, "
+          f"songs-only call: {tiered['tier1_bytes_per_call'] / 1024:.1f} KB, "
+          f"unfiltered call: {report['previous']['bytes_per_track'] / 1024:.1f} KB")